@@ -0,0 +1,144 @@
+import datetime
+import functools
+import json
+import logging
+
+import flask
+
+import common
+import data
+
+LOG = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 15  # seconds
+
+bp = flask.Blueprint("api", __name__, url_prefix="/api")
+
+
+def conditional(parse_args=lambda: {}):
+    """Answer with 304 if the client already has the current data version.
+
+    The query arguments are parsed by parse_args first, so an invalid
+    request is answered with 400 even if the ETag matches, then they are
+    passed to the decorated function as keyword arguments.
+
+    The ETag changes when the data is reloaded or changed, or the day rolls
+    over, so the runtime of a running task is as of generated_at and the
+    client is expected to extrapolate it from the start time of the active
+    task.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper():
+            kwargs = parse_args()
+            ctrl = data.Controller.get()
+            etag = (
+                f"{ctrl.load_token}-{ctrl.version}-{datetime.date.today()}")
+            # If-None-Match uses weak comparison, e.g. a compressing proxy
+            # turns the ETag into a weak one
+            if flask.request.if_none_match.contains_weak(etag):
+                response = flask.Response(status=304)
+            else:
+                response = flask.jsonify(func(**kwargs))
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def parse_date_range_args() -> dict:
+    today = datetime.date.today()
+    return {
+        "start": common.parse_date("start", today),
+        "end": common.parse_date("end", today),
+    }
+
+
+def parse_days_args() -> dict:
+    try:
+        days = int(flask.request.args.get("days", 7))
+    except ValueError:
+        flask.abort(400, "days needs to be an integer")
+    return {"days": max(1, min(days, common.MAX_DAILY_SUMMARIES))}
+
+
+@bp.route("/current")
+@conditional()
+def get_current():
+    ctrl = data.Controller.get()
+    now = datetime.datetime.now()
+    task = ctrl.get_active_task()
+    active = None
+    if task:
+        active = {
+            "id": task.id,
+            "name": task.name,
+            "started_at": ctrl.get_active_task_start_time().isoformat(),
+        }
+
+    return {
+        "generated_at": now.isoformat(),
+        "active_task": active,
+        "today_total": ctrl.get_daily_summary(
+            now.date()).get_total_time().total_seconds(),
+    }
+
+
+@bp.route("/runtimes")
+@conditional(parse_date_range_args)
+def get_runtimes(start: datetime.date, end: datetime.date):
+    ctrl = data.Controller.get()
+    return {
+        "generated_at": datetime.datetime.now().isoformat(),
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "tasks": [
+            {k: common.to_primitive(v) for k, v in row.items()}
+            for row in ctrl.iter_tasks_rows(start, end)
+        ],
+    }
+
+
+@bp.route("/summaries")
+@conditional(parse_days_args)
+def get_daily_summaries(days: int):
+    ctrl = data.Controller.get()
+    return {
+        "generated_at": datetime.datetime.now().isoformat(),
+        "days": ctrl.get_daily_summary_table(days).get_data(),
+    }
+
+
+@bp.route("/events")
+def get_events():
+    """Server-sent events with the data version and the active task name,
+    sent on connect and on every change.
+
+    Each stream holds a connection, and the server speaks HTTP/1.1 only,
+    where browsers allow about 6 connections per host, so a browser should
+    share one stream between its tabs, see assets/change_feed.js.
+    """
+    ctrl = data.Controller.get()
+
+    def stream():
+        version = None
+        while True:
+            new_version = ctrl.wait_for_change(version, KEEPALIVE_INTERVAL)
+            if new_version == version:
+                # a comment line so proxies do not close an idle connection
+                yield ": keepalive\n\n"
+                continue
+
+            version = new_version
+            state = {
+                "version": ctrl.get_version_tag(),
+                "active_task": ctrl.get_active_task_name(),
+            }
+            yield f"data: {json.dumps(state)}\n\n"
+
+    response = flask.Response(stream(), mimetype="text/event-stream")
+    response.cache_control.no_cache = True
+    return response
@@ -3,12 +3,17 @@ import logging
 import dash
 from dash import Dash, html, dcc
 
+import api
+import export
+
 logging.basicConfig(
     level=logging.DEBUG,
     format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S')
 
 app = Dash(__name__, use_pages=True)
+app.server.register_blueprint(api.bp)
+app.server.register_blueprint(export.bp)
 
 app.layout = html.Div([
     html.Div([
@@ -0,0 +1,100 @@
+// Listens to the change feed of the server (/api/events) while the home page
+// is shown and pushes the new state into it, which refetches its tables only
+// if it does not show that data version yet.
+//
+// The development server speaks HTTP/1.1 only, where browsers allow about 6
+// connections per host, and an open event stream holds one of them for
+// good. With a stream per tab a few open tabs would use up the limit and
+// every Dash callback request would hang. So the stream is only open while
+// the home page is mounted, and the tabs share a single one: the tab holding
+// the lock opens it and forwards the messages to the others over a
+// BroadcastChannel. When that tab leaves the home page or is closed the lock
+// passes to the next tab waiting for it.
+(function () {
+    var NAME = "time-tracker-change-feed";
+    var shared = "BroadcastChannel" in window && "locks" in navigator;
+    var channel = shared ? new BroadcastChannel(NAME) : null;
+    var source = null;
+    var release = null;
+    var abort = null;
+
+    function isMounted() {
+        return document.getElementById("title") !== null;
+    }
+
+    function apply(state) {
+        if (!isMounted()) {
+            return;
+        }
+        dash_clientside.set_props("title", {children: state.active_task});
+        dash_clientside.set_props("new-version", {data: state.version});
+    }
+
+    function open() {
+        source = new EventSource("/api/events");
+        source.onmessage = function (event) {
+            var state = JSON.parse(event.data);
+            apply(state);
+            if (channel) {
+                channel.postMessage(state);
+            }
+        };
+    }
+
+    function close() {
+        if (source) {
+            source.close();
+            source = null;
+        }
+        if (release) {
+            release();
+            release = null;
+        }
+        if (abort) {
+            abort.abort();
+            abort = null;
+        }
+    }
+
+    function start() {
+        if (!shared) {
+            open();
+            return;
+        }
+        abort = new AbortController();
+        navigator.locks.request(NAME, {signal: abort.signal}, function () {
+            abort = null;
+            open();
+            // the lock is held until the returned promise resolves
+            return new Promise(function (resolve) {
+                release = resolve;
+            });
+        }).catch(function () {
+            // aborted while waiting for the lock
+        });
+    }
+
+    if (channel) {
+        channel.onmessage = function (event) {
+            apply(event.data);
+        };
+    }
+
+    var started = false;
+    function update() {
+        if (isMounted() && !started) {
+            started = true;
+            start();
+        } else if (!isMounted() && started) {
+            started = false;
+            close();
+        }
+    }
+
+    window.addEventListener("load", function () {
+        // Dash swaps the pages without a page load
+        new MutationObserver(update).observe(
+            document.body, {childList: true, subtree: true});
+        update();
+    });
+})();
@@ -0,0 +1,23 @@
+import datetime
+
+import flask
+
+MAX_DAILY_SUMMARIES = 31  # days
+
+
+def to_primitive(value):
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def parse_date(arg: str, default: datetime.date) -> datetime.date:
+    value = flask.request.args.get(arg)
+    if value is None:
+        return default
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        flask.abort(400, f"Invalid {arg} date '{value}'")
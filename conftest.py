@@ -0,0 +1,2 @@
+# Lets pytest import the modules of the repository root, e.g. data, without
+# installing them.
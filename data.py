@@ -1,15 +1,18 @@
-from typing import List, Optional, Dict, Set
+from typing import List, Optional, Dict, Set, Iterator, TYPE_CHECKING
 
-import copy
+import bisect
 import json
 import enum
 import datetime
 import collections
 import logging
 import math
-import itertools
-import pandas as pd
+import shutil
 import sys
+import threading
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 LOG = logging.getLogger(__name__)
 
@@ -58,6 +61,12 @@ class Tasks:
     def to_primitive(self):
         return [task.to_primitive() for task in self.tasks]
 
+    def get_label_keys(self) -> Set[str]:
+        label_keys = set()
+        for task in self.tasks:
+            label_keys |= task.labels.keys()
+        return label_keys
+
     def __iter__(self):
         for t in self.tasks:
             yield t
@@ -78,6 +87,9 @@ class Activity:
         self.task_id = task_id
         self.action = action
         self.at = at
+        # parsed once as every range query needs it, it can be later than at
+        # if the clock went backwards, see normalize_activities
+        self.time = datetime.datetime.fromisoformat(at)
 
     @classmethod
     def from_primitive(cls, primitive):
@@ -92,22 +104,221 @@ class Activity:
             "at": self.at,
         }
 
+class Span:
+    """A run of a task, end is None while the task is still running."""
+    def __init__(
+        self,
+        task_id: int,
+        start: datetime.datetime,
+        end: Optional[datetime.datetime],
+    ):
+        self.task_id = task_id
+        self.start = start
+        self.end = end
+
+    def get_end(self) -> datetime.datetime:
+        return self.end or datetime.datetime.now()
+
+    def get_duration(self) -> datetime.timedelta:
+        return self.get_end() - self.start
+
+    def clip(self, start: datetime.datetime, end: datetime.datetime) -> "Span":
+        if self.end is None:
+            clipped_end = None if datetime.datetime.now() < end else end
+        else:
+            clipped_end = min(self.end, end)
+        return Span(self.task_id, max(self.start, start), clipped_end)
+
+def downsample_spans(
+    spans: List[Span],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    nr_of_slots: int,
+) -> List[Span]:
+    """Reduce the spans in [start, end) to at most twice nr_of_slots.
+
+    If there are not more spans than slots they are returned as they are.
+    Otherwise the range is cut into nr_of_slots slots and only the spans
+    shorter than a slot are downsampled: in each slot they are replaced by
+    the task that ran the most among them, spanning from the first to the
+    last of them, if they ran for at least half of that time, otherwise the
+    slot is left idle there. The longer spans keep their boundaries, and
+    neighbouring spans of the same task are joined. So besides the at most
+    nr_of_slots long spans there is at most one span per slot, and the spans
+    do not overlap.
+    """
+    resolved = [Span(s.task_id, s.start, s.get_end()) for s in spans]
+    if len(resolved) <= nr_of_slots:
+        return resolved
+
+    resolution = (end - start) / nr_of_slots
+    long_spans = [s for s in resolved if s.get_duration() >= resolution]
+
+    runtimes: Dict[int, Dict[int, datetime.timedelta]] = (
+        collections.defaultdict(
+            lambda: collections.defaultdict(datetime.timedelta)))
+    bounds: Dict[int, List[datetime.datetime]] = {}
+    for span in resolved:
+        if span.get_duration() >= resolution:
+            continue
+
+        at = span.start
+        slot = (at - start) // resolution
+        while at < span.end:
+            slot_end = min(start + (slot + 1) * resolution, span.end)
+            runtimes[slot][span.task_id] += slot_end - at
+            first, last = bounds.get(slot, (at, slot_end))
+            bounds[slot] = (min(first, at), max(last, slot_end))
+            at = slot_end
+            slot += 1
+
+    downsampled = list(long_spans)
+    for slot, by_task_id in runtimes.items():
+        lo, hi = bounds[slot]
+        # the long spans may cover part of the slot, keep them intact
+        i = bisect.bisect_right(long_spans, lo, key=lambda s: s.end)
+        while i < len(long_spans) and long_spans[i].start < hi:
+            if long_spans[i].start <= lo:
+                lo = max(lo, long_spans[i].end)
+            else:
+                hi = min(hi, long_spans[i].start)
+            i += 1
+        if hi <= lo:
+            continue
+        if sum(by_task_id.values(), datetime.timedelta()) * 2 < hi - lo:
+            continue
+
+        task_id = max(by_task_id, key=by_task_id.get)
+        downsampled.append(Span(task_id, lo, hi))
+
+    joined: List[Span] = []
+    for span in sorted(downsampled, key=lambda s: s.start):
+        last = joined[-1] if joined else None
+        if last and last.task_id == span.task_id and last.end == span.start:
+            last.end = span.end
+        else:
+            joined.append(span)
+
+    return joined
+
+def normalize_activities(activities: List[Activity]) -> List[Activity]:
+    """Repair the activities so that they satisfy the invariants of
+    Activities: at most one running task, and every STOP directly follows
+    the START of the same task.
+
+    The order of the activities is kept as that is the order they happened.
+    The clock can go backwards though, e.g. at the end of daylight saving
+    time as the times are local, so the time of such an activity is moved
+    forward to the previous one to keep the times sorted. Its at is kept as
+    it is so the stored activities are not changed by this.
+    """
+    next_id = max([a.id for a in activities], default=-1) + 1
+    normalized = []
+    active_task_id = None
+    for act in activities:
+        if normalized and act.time < normalized[-1].time:
+            LOG.warning(
+                "Activity %d at %s is earlier than the previous one, using "
+                "the time of that instead", act.id, act.at)
+            act.time = normalized[-1].time
+
+        if act.action == Action.START:
+            if act.task_id == active_task_id:
+                LOG.warning(
+                    "Dropping activity %d as task %d is already running",
+                    act.id, act.task_id)
+                continue
+            if active_task_id is not None:
+                LOG.warning(
+                    "Stopping task %d at %s as task %d is started",
+                    active_task_id, act.at, act.task_id)
+                stop = Activity(next_id, active_task_id, Action.STOP, act.at)
+                stop.time = act.time
+                normalized.append(stop)
+                next_id += 1
+            active_task_id = act.task_id
+        else:
+            if act.task_id != active_task_id:
+                LOG.warning(
+                    "Dropping activity %d as task %d is not running",
+                    act.id, act.task_id)
+                continue
+            active_task_id = None
+        normalized.append(act)
+
+    return normalized
+
 class Activities:
-    def __init__(self, activities: List[Activity]):
+    """Activities in chronological order with the runs of the tasks kept
+    as a list of Spans.
+
+    The loaded log is normalized once by normalize_activities and every new
+    activity is validated, so it alternates between START and STOP of the
+    same task, i.e. at most one task runs at a time, and the read paths can
+    rely on this. The filtered instances do not alternate, e.g. a day can
+    start with a STOP, but their spans are cut from the ones of the log.
+    """
+    def __init__(
+        self,
+        activities: List[Activity],
+        spans: Optional[List[Span]] = None,
+    ):
         self.activities = activities
+        # the list of times can be used as an index for range queries
+        self.times = [a.time for a in activities]
+        if spans is None:
+            if any(a > b for a, b in zip(self.times, self.times[1:])):
+                raise ValueError(
+                    "Activities are not in time order, use "
+                    "normalize_activities first")
+            spans = []
+            for act in activities:
+                active = bool(spans) and spans[-1].end is None
+                if act.action == Action.START and not active:
+                    spans.append(Span(act.task_id, act.time, None))
+                elif (act.action == Action.STOP and active
+                        and spans[-1].task_id == act.task_id):
+                    spans[-1].end = act.time
+                else:
+                    raise ValueError(
+                        f"Activity {act.id} breaks the alternation of START "
+                        f"and STOP, use normalize_activities first")
+        self.spans = spans
+        # set if normalize_activities had to change the loaded activities
+        self.repaired = False
 
     @classmethod
     def from_primitive(cls, primitive) -> "Activities":
-        return Activities([Activity.from_primitive(act) for act in primitive])
+        activities = [Activity.from_primitive(act) for act in primitive]
+        normalized = normalize_activities(activities)
+        loaded = Activities(normalized)
+        loaded.repaired = normalized != activities
+        return loaded
 
     def to_primitive(self):
         return [activity.to_primitive() for activity in self.activities]
 
     def create_one(self, task_id: int, action: Action) -> Activity:
+        active_task_id = self.get_active_task_id()
+        if action == Action.START and active_task_id is not None:
+            raise ValueError(
+                f"Cannot start task {task_id} while task {active_task_id} "
+                f"is running")
+        if action == Action.STOP and task_id != active_task_id:
+            raise ValueError(f"Cannot stop task {task_id} as it is not running")
+
         at = datetime.datetime.now().isoformat()
         activity = Activity(
             id=self._next_id(), task_id=task_id, action=action, at=at)
+        if self.times and activity.time < self.times[-1]:
+            # the clock went backwards, keep the times sorted
+            activity.time = self.times[-1]
         self.activities.append(activity)
+        self.times.append(activity.time)
+        if action == Action.START:
+            self.spans.append(Span(task_id, activity.time, None))
+        else:
+            self.spans[-1].end = activity.time
         return activity
 
     def _next_id(self) -> int:
@@ -122,71 +333,66 @@ class Activities:
             act_by_task_id[act.task_id].append(act)
         return act_by_task_id
 
-    def get_active_task_id(self) -> Optional[int]:
-        act_by_task_id = self.get_activities_by_task_id()
-
-        def is_active(acts: List[Activity]):
-            if not acts:
-                return False
-            return acts[-1].action == Action.START
-
-        active_task_ids = [
-            id for id, acts in act_by_task_id.items() if is_active(acts)]
-
-        if len(active_task_ids) > 1:
-            LOG.warning(
-                "Multiple active tasks %s, using most recent one.",
-                str(active_task_ids))
-
-        if not active_task_ids:
-            return None
+    def get_active_span(self) -> Optional[Span]:
+        if self.spans and self.spans[-1].end is None:
+            return self.spans[-1]
+        return None
 
-        return active_task_ids[0]
+    def get_active_task_id(self) -> Optional[int]:
+        span = self.get_active_span()
+        return span.task_id if span else None
 
     def get_task_runtime(self, task_id):
         return self.filter_by_task(task_id).get_runtime()
 
+    def _slice(
+        self,
+        start: datetime.datetime,
+        end: datetime.datetime,
+    ) -> "Activities":
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_left(self.times, end)
+        # spans do not overlap so both their starts and ends are sorted
+        span_lo = bisect.bisect_right(self.spans, start, key=Span.get_end)
+        span_hi = bisect.bisect_left(self.spans, end, key=lambda s: s.start)
+        return Activities(
+            self.activities[lo:hi],
+            [s.clip(start, end) for s in self.spans[span_lo:span_hi]],
+        )
+
     def filter_by_day(self, day: datetime.date) -> "Activities":
-        daily_activities = [
-            a for a in self.activities
-            if datetime.datetime.fromisoformat(a.at).date() == day
-            ]
-        return Activities(daily_activities)
+        return self.filter_by_date_range(day, day)
 
     def filter_by_date_range(
         self,
         start: datetime.date,
         end: datetime.date
     ) -> "Activities":
-        activities = [
-            a for a in self.activities
-            if start <= datetime.datetime.fromisoformat(a.at).date() <= end
-            ]
-        return Activities(activities)
+        return self._slice(
+            datetime.datetime.combine(start, datetime.time.min),
+            datetime.datetime.combine(
+                end + datetime.timedelta(days=1), datetime.time.min),
+        )
+
+    def get_spans(
+        self,
+        start: datetime.datetime,
+        end: datetime.datetime,
+    ) -> List[Span]:
+        """Return the spans of task runs overlapping with [start, end), cut
+        at the boundaries of the range.
+        """
+        return self._slice(start, end).spans
 
     def filter_by_task(self, task_id: int) -> "Activities":
-        return Activities([a for a in self.activities if a.task_id == task_id])
+        return Activities(
+            [a for a in self.activities if a.task_id == task_id],
+            [s for s in self.spans if s.task_id == task_id],
+        )
 
     def get_runtime(self) -> datetime.timedelta:
-        acts = copy.deepcopy(self.activities)
-        if len(acts) % 2 == 1:
-            # A task is active, calculate with the current time as end time
-            acts.append(
-                Activity(
-                    -1,
-                    self.get_active_task_id(),
-                    Action.STOP,
-                    at=datetime.datetime.now().isoformat()
-                    )
-                )
-
-        runtime = datetime.timedelta()
-        for start, stop in itertools.batched(acts, n=2):
-            runtime += (
-                datetime.datetime.fromisoformat(stop.at)
-                - datetime.datetime.fromisoformat(start.at))
-
-        return runtime
+        return sum(
+            (s.get_duration() for s in self.spans), datetime.timedelta())
 
     def __iter__(self):
         for a in self.activities:
@@ -203,31 +409,30 @@ class TasksDataFrame:
         self.tasks = tasks
         self.activities = activities
 
-    def get_df(self) -> pd.DataFrame:
-
-        label_keys = set()
-        for task in self.tasks:
-            label_keys |= task.labels.keys()
+    def iter_rows(self) -> Iterator[dict]:
+        label_keys = self.tasks.get_label_keys()
 
-        name = []
-        runtime = []
-        runtime_str = []
-        labels = collections.defaultdict(list)
         for task in self.tasks:
-            name.append(task.name)
             r = self.activities.get_task_runtime(task.id)
-            runtime.append(r)
-            runtime_str.append(
-                str(datetime.timedelta(seconds=math.floor(r.total_seconds()))))
+            row = {
+                "name": task.name,
+                "runtime": r,
+                "runtime_str": str(
+                    datetime.timedelta(seconds=math.floor(r.total_seconds()))),
+            }
             for key in label_keys:
-                labels[key].append(task.labels.get(key, None))
+                row[key] = task.labels.get(key, None)
+            yield row
 
-        df = {
-            "name": name,
-            "runtime": runtime,
-            "runtime_str": runtime_str,
-        }
-        df.update(labels)
+    def get_df(self) -> "pd.DataFrame":
+        import pandas as pd
+
+        df = collections.defaultdict(list)
+        for column in ["name", "runtime", "runtime_str"]:
+            df[column] = []
+        for row in self.iter_rows():
+            for key, value in row.items():
+                df[key].append(value)
 
         return pd.DataFrame(df)
 
@@ -345,57 +550,18 @@ class DailyWorkSummaryTableView:
             })
         return data
 
-class DailyTimelineDataFrame:
-    def __init__(self, tasks: Tasks, activities: Activities):
+class TimelineDataFrame:
+    def __init__(self, tasks: Tasks, spans: List[Span]):
         self.tasks = tasks
-        self.activities = copy.deepcopy(activities)
+        self.spans = spans
 
-    def get_df(self) -> pd.DataFrame:
-
-        if not self.activities:
-            return pd.DataFrame({
-            "name": [],
-            "start": [],
-            "end": [],
-        })
-
-        # ensure that the the frame has a proper start with an start action
-        # and an end with an end action. Insert dummy actions if needed
-        if self.activities[0].action != Action.START:
-            dummy_start = copy.deepcopy(self.activities[0])
-            dummy_start.action = Action.START
-            first = datetime.datetime.fromisoformat(dummy_start.at)
-            dummy_start.at = first.replace(
-                hours=0, minute=0, second=0).isoformat()
-
-            self.activities.activities.insert(0, dummy_start)
-
-        if self.activities[-1].action != Action.STOP:
-            dummy_end = copy.deepcopy(self.activities[-1])
-            dummy_end.action = Action.STOP
-            last = datetime.datetime.fromisoformat(dummy_end.at)
-            if last.date() == datetime.date.today():
-                dummy_end.at = datetime.datetime.now().isoformat()
-            else:
-                dummy_end.at = last.replace(
-                    hours=23, minute=59, second=59).isoformat()
-
-            self.activities.activities.append(dummy_end)
-
-        names = []
-        starts = []
-        ends = []
-        # as we ensured above we can assume that activities come in
-        # start,stop pairs in the list
-        for start, stop in itertools.batched(self.activities, n=2):
-            names.append(self.tasks.get_by_id(start.task_id).name)
-            starts.append(start.at)
-            ends.append(stop.at)
+    def get_df(self) -> "pd.DataFrame":
+        import pandas as pd
 
         df = {
-            "name": names,
-            "start": starts,
-            "end": ends,
+            "name": [self.tasks.get_by_id(s.task_id).name for s in self.spans],
+            "start": [s.start.isoformat() for s in self.spans],
+            "end": [s.end.isoformat() for s in self.spans],
         }
 
         return pd.DataFrame(df)
@@ -424,22 +590,41 @@ class Controller:
         with open(self.data_dir + "/activities.json", 'r') as fp:
             self.activities = Activities.from_primitive(json.load(fp))
 
+        if self.activities.repaired:
+            # the repaired activities overwrite the file on the next save
+            backup = (
+                self.data_dir + "/activities.json." +
+                datetime.datetime.now().strftime("%Y%m%d%H%M%S"))
+            shutil.copyfile(self.data_dir + "/activities.json", backup)
+            LOG.warning(
+                "Activities are repaired, the original is kept as %s", backup)
+
+        # bumped on every change so readers can tell if they are up to date,
+        # the token tells apart versions of different loads
+        self.version = 0
+        self.load_token = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+        # serializes the changes so the state checks and the appends of
+        # concurrent requests do not interleave
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+
         LOG.info("Data loaded from disk")
 
     def get_tasks_view(self) -> TasksView:
         return TasksView(self.tasks, self.activities)
 
     def change_task_state(self, task_id):
-        active_task_id = self.activities.get_active_task_id()
-        if task_id == active_task_id:
-            self.stop_task(task_id)
-        elif active_task_id is None:
-            self.start_task(task_id)
-        else:
-            self.stop_task(active_task_id)
-            self.start_task(task_id)
+        with self.lock:
+            active_task_id = self.activities.get_active_task_id()
+            if task_id == active_task_id:
+                self.stop_task(task_id)
+            elif active_task_id is None:
+                self.start_task(task_id)
+            else:
+                self.stop_task(active_task_id)
+                self.start_task(task_id)
 
-        self.save()
+            self.save()
 
     def stop_task(self, task_id):
         LOG.info("Stopping task '%s'", self.tasks.get_by_id(task_id).name)
@@ -450,11 +635,27 @@ class Controller:
         self.activities.create_one(task_id, Action.START)
 
     def save(self):
-        with open(self.data_dir + "/tasks.json", "w") as fp:
-            json.dump(self.tasks.to_primitive(), fp, indent=2)
+        with self.lock:
+            with open(self.data_dir + "/tasks.json", "w") as fp:
+                json.dump(self.tasks.to_primitive(), fp, indent=2)
+
+            with open(self.data_dir + "/activities.json", "w") as fp:
+                json.dump(self.activities.to_primitive(), fp, indent=2)
 
-        with open(self.data_dir + "/activities.json", "w") as fp:
-            json.dump(self.activities.to_primitive(), fp, indent=2)
+            self.version += 1
+            self.changed.notify_all()
+
+    def get_version_tag(self) -> str:
+        """The data version that is unique across loads of the data."""
+        return f"{self.load_token}-{self.version}"
+
+    def wait_for_change(self, version: Optional[int], timeout: float) -> int:
+        """Wait until the data version differs from version and return the
+        current version, which is the same as version on timeout.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
 
     def get_daily_summary_table(
         self,
@@ -465,18 +666,27 @@ class Controller:
 
     def get_active_task(self) -> Optional[Task]:
         active_id = self.activities.get_active_task_id()
-        if not active_id:
+        if active_id is None:
             return None
 
         return self.tasks.get_by_id(active_id)
 
+    def get_active_task_start_time(self) -> Optional[datetime.datetime]:
+        span = self.activities.get_active_span()
+        return span.start if span else None
+
+    def get_daily_summary(self, day: datetime.date) -> DailyWorkSummaryView:
+        return DailyWorkSummaryView(
+            self.tasks, self.activities.filter_by_day(day))
+
     def get_active_task_name(self) -> str:
         task = self.get_active_task()
         return task.name if task else ""
 
     def add_task(self, name:str) -> Task:
-        task = self.tasks.create_one(name)
-        self.save()
+        with self.lock:
+            task = self.tasks.create_one(name)
+            self.save()
         LOG.info("Adding task '%s'(%d)", task.name, task.id)
         return task
 
@@ -484,15 +694,72 @@ class Controller:
         self,
         start_date: datetime.date,
         end_date: datetime.date,
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
         return TasksDataFrame(
             self.tasks,
             self.activities.filter_by_date_range(start_date, end_date)
         ).get_df()
 
+    def get_task_label_keys(self) -> List[str]:
+        return sorted(self.tasks.get_label_keys())
+
     def get_first_activity_date(self) -> datetime.datetime:
         return datetime.datetime.fromisoformat(self.activities[0].at)
 
-    def get_daily_timeline_dataframe(self, at: datetime.date):
-        return DailyTimelineDataFrame(
-            self.tasks, self.activities.filter_by_day(at)).get_df()
+    def iter_activities(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> Iterator[dict]:
+        for act in self.activities.filter_by_date_range(start_date, end_date):
+            yield {
+                "id": act.id,
+                "task_id": act.task_id,
+                "task_name": self.tasks.get_by_id(act.task_id).name,
+                "action": act.action.name,
+                "at": act.at,
+            }
+
+    def iter_daily_task_runtimes(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> Iterator[dict]:
+        day = start_date
+        while day <= end_date:
+            runtimes = collections.defaultdict(datetime.timedelta)
+            for span in self.activities.filter_by_day(day).spans:
+                runtimes[span.task_id] += span.get_duration()
+            for task_id, runtime in sorted(runtimes.items()):
+                yield {
+                    "day": day,
+                    "task_id": task_id,
+                    "name": self.tasks.get_by_id(task_id).name,
+                    "runtime": runtime,
+                }
+            day += datetime.timedelta(days=1)
+
+    def iter_tasks_rows(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> Iterator[dict]:
+        return TasksDataFrame(
+            self.tasks,
+            self.activities.filter_by_date_range(start_date, end_date)
+        ).iter_rows()
+
+    def get_timeline_dataframe(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        nr_of_slots: int,
+    ) -> "pd.DataFrame":
+        start = datetime.datetime.combine(start_date, datetime.time.min)
+        end = datetime.datetime.combine(
+            end_date + datetime.timedelta(days=1), datetime.time.min)
+        spans = self.activities.get_spans(start, end)
+        return TimelineDataFrame(
+            self.tasks,
+            downsample_spans(spans, start, end, nr_of_slots),
+        ).get_df()
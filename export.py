@@ -0,0 +1,198 @@
+import csv
+import datetime
+import io
+import itertools
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List
+
+import flask
+
+import common
+import data
+
+LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000  # rows
+
+# column name -> type, the exports always have these columns even if empty
+ACTIVITIES_COLUMNS = {
+    "id": "int",
+    "task_id": "int",
+    "task_name": "str",
+    "action": "str",
+    "at": "str",
+}
+RUNTIMES_COLUMNS = {
+    "day": "str",
+    "task_id": "int",
+    "name": "str",
+    "runtime": "float",
+}
+TASKS_COLUMNS = {
+    "name": "str",
+    "runtime": "float",
+    "runtime_str": "str",
+}
+
+bp = flask.Blueprint("export", __name__, url_prefix="/export")
+
+
+def chunked(rows: Iterable[dict]) -> Iterator[List[dict]]:
+    for chunk in itertools.batched(rows, n=CHUNK_SIZE):
+        yield [
+            {k: common.to_primitive(v) for k, v in row.items()}
+            for row in chunk
+        ]
+
+
+def stream_csv(
+    rows: Iterable[dict],
+    columns: Dict[str, str],
+) -> Iterator[str]:
+    buf = io.StringIO()
+    csv.DictWriter(buf, fieldnames=list(columns)).writeheader()
+    yield buf.getvalue()
+
+    for chunk in chunked(rows):
+        buf = io.StringIO()
+        csv.DictWriter(buf, fieldnames=list(columns)).writerows(chunk)
+        yield buf.getvalue()
+
+
+def stream_jsonl(
+    rows: Iterable[dict],
+    columns: Dict[str, str],
+) -> Iterator[str]:
+    for chunk in chunked(rows):
+        yield "".join(json.dumps(row) + "\n" for row in chunk)
+
+
+class ChunkSink:
+    """A write-only file object that hands out what was written so far.
+
+    ParquetWriter needs a file with a stable position as it records offsets
+    in the footer, so the position is tracked separately from the buffer
+    that is drained after each row group.
+    """
+    def __init__(self):
+        self.buf = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, b) -> int:
+        self.buf.append(bytes(b))
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        out = b"".join(self.buf)
+        self.buf = []
+        return out
+
+
+def stream_parquet(
+    rows: Iterable[dict],
+    columns: Dict[str, str],
+) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    schema = pa.schema([(name, types[t]) for name, t in columns.items()])
+    str_columns = [name for name, t in columns.items() if t == "str"]
+
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunked(rows):
+        for row in chunk:
+            for name in str_columns:
+                if row[name] is not None:
+                    row[name] = str(row[name])
+        # one row group per chunk so it can be sent out right away
+        writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+FORMATS = {
+    "csv": (stream_csv, "text/csv"),
+    "jsonl": (stream_jsonl, "application/jsonl"),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet"),
+}
+
+
+def export(
+    name: str,
+    rows_func,
+    columns: Dict[str, str],
+) -> flask.Response:
+    ctrl = data.Controller.get()
+    fmt = flask.request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        flask.abort(
+            400, f"Unknown format '{fmt}', use one of {', '.join(FORMATS)}")
+
+    if fmt == "parquet":
+        # pyarrow is in requirements.txt, but only imported when needed
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            flask.abort(501, "Parquet export needs pyarrow to be installed")
+
+    if ctrl.activities:
+        first = ctrl.get_first_activity_date().date()
+    else:
+        first = datetime.date.today()
+    start = common.parse_date("start", first)
+    end = common.parse_date("end", datetime.date.today())
+    LOG.info("Exporting %s between %s - %s as %s", name, start, end, fmt)
+
+    stream, mimetype = FORMATS[fmt]
+    filename = f"{name}_{start}_{end}.{fmt}"
+    return flask.Response(
+        flask.stream_with_context(
+            stream(rows_func(start, end), columns)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@bp.route("/activities")
+def export_activities():
+    return export(
+        "activities",
+        data.Controller.get().iter_activities,
+        ACTIVITIES_COLUMNS,
+    )
+
+
+@bp.route("/runtimes")
+def export_daily_task_runtimes():
+    return export(
+        "runtimes",
+        data.Controller.get().iter_daily_task_runtimes,
+        RUNTIMES_COLUMNS,
+    )
+
+
+@bp.route("/tasks")
+def export_tasks():
+    ctrl = data.Controller.get()
+    columns = dict(TASKS_COLUMNS)
+    columns.update({key: "str" for key in ctrl.get_task_label_keys()})
+    return export("tasks", ctrl.iter_tasks_rows, columns)
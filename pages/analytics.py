@@ -1,8 +1,6 @@
 import dash
 from dash import html, dcc, Input, Output
 import data
-import plotly.express as px
-import pandas as pd
 import datetime
 
 dash.register_page(__name__)
@@ -31,6 +29,8 @@ def get_tasks_pie(
     end_date_str=None,
     group_by="name",
 ):
+    import plotly.express as px
+
     start, end = parse_time_range(start_date_str, end_date_str)
 
     df = ctrl.get_tasks_dataframe(start, end)
@@ -51,26 +51,27 @@ def get_tasks_pie(
     return fig
 
 
-layout = html.Div([
-    dcc.DatePickerRange(
-        id='my-date-picker-range',
-        start_date=datetime.date.today() - datetime.timedelta(days=7),
-        end_date=datetime.date.today(),
-        min_date_allowed=ctrl.get_first_activity_date().date(),
-        first_day_of_week=1,
-        minimum_nights=0,
-    ),
-    dcc.Dropdown(
-        id='category-dropdown',
-        options=[o for o in ctrl.get_tasks_dataframe(*parse_time_range()) if o not in ["runtime", "runtime_str"]],
-        value="name",
-    ),
-    dcc.Graph(
-        id='tasks-pie-chart',
-        figure=get_tasks_pie(),
-        style={'height': '90vh'},
-    ),
-])
+def layout(**kwargs):
+    # the pie chart is filled by the initial call of update_pie_chart
+    return html.Div([
+        dcc.DatePickerRange(
+            id='my-date-picker-range',
+            start_date=datetime.date.today() - datetime.timedelta(days=7),
+            end_date=datetime.date.today(),
+            min_date_allowed=ctrl.get_first_activity_date().date(),
+            first_day_of_week=1,
+            minimum_nights=0,
+        ),
+        dcc.Dropdown(
+            id='category-dropdown',
+            options=["name"] + ctrl.get_task_label_keys(),
+            value="name",
+        ),
+        dcc.Graph(
+            id='tasks-pie-chart',
+            style={'height': '90vh'},
+        ),
+    ])
 
 @dash.callback(
     Output('tasks-pie-chart', 'figure'),
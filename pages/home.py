@@ -1,10 +1,9 @@
 import dash
 from dash import Dash, html, dash_table, Output, Input, State, dcc
+import common
 import data
 import logging
 
-MAX_DAILY_SUMMARIES = 31  # days
-
 logging.basicConfig(
     level=logging.DEBUG,
     format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
@@ -15,93 +14,100 @@ dash.register_page(__name__, path='/')
 
 ctrl = data.Controller.get()
 
-layout = html.Div([
-    html.H1(id="title",children="", hidden=True),
-    html.Div(id="empty"),
-    html.Div([
-        dash_table.DataTable(
-            id='table-tasks',
-            fixed_rows={'headers': True},
-            columns=[
-                {"id": n, "name": n}
-                for n in data.TasksView.get_columns()],
-            data=ctrl.get_tasks_view().get_data(),
-            editable=False,
-            style_data_conditional=[
-            {
-                'if': {
-                    'filter_query': '{state} = running',
+def layout(**kwargs):
+    # the tables are filled by the initial call of refresh, and refreshed
+    # whenever the data version changes. A new version comes either from a
+    # change made in this tab or is pushed to assets/change_feed.js, and is
+    # only taken over into data-version if this tab does not show it yet
+    return html.Div([
+        dcc.Store(id="data-version", data=ctrl.get_version_tag()),
+        dcc.Store(id="new-version"),
+        html.H1(id="title",children="", hidden=True),
+        html.Div(id="empty"),
+        html.Div([
+            dash_table.DataTable(
+                id='table-tasks',
+                fixed_rows={'headers': True},
+                columns=[
+                    {"id": n, "name": n}
+                    for n in data.TasksView.get_columns()],
+                data=[],
+                editable=False,
+                style_data_conditional=[
+                {
+                    'if': {
+                        'filter_query': '{state} = running',
+                    },
+                    'backgroundColor': 'salmon',
+                },
+                ],
+                filter_action="native",
+                filter_options={"case": "insensitive"},
+                page_size=10,
+                style_cell={'textAlign': 'left'},
+                style_header={
+                    'fontWeight': 'bold'
                 },
-                'backgroundColor': 'salmon',
-            },
-            ],
-            filter_action="native",
-            filter_options={"case": "insensitive"},
-            page_size=10,
-            style_cell={'textAlign': 'left'},
-            style_header={
-                'fontWeight': 'bold'
-            },
-        ),
-        dcc.Input(
-            id="task-name-input",
-            placeholder="new task name",
-        ),
-        html.Button(
-            id="new-task-button",
-            children="Start New",
-        ),
-    ]),
-    html.Hr(),
-    html.Div([
-        dash_table.DataTable(
-            id='table-daily-summaries',
-            fixed_rows={'headers': True},
-            columns=[
-                {"id": n, "name": n}
-                for n in data.DailyWorkSummaryTableView.get_columns()],
-            data=ctrl.get_daily_summary_table(MAX_DAILY_SUMMARIES).get_data(),
-            editable=False,
-            page_size=10,
-            style_cell={'textAlign': 'left'},
-            style_header={
-                'fontWeight': 'bold'
-            },
-        ),
-    ]),
-])
+            ),
+            dcc.Input(
+                id="task-name-input",
+                placeholder="new task name",
+            ),
+            html.Button(
+                id="new-task-button",
+                children="Start New",
+            ),
+        ]),
+        html.Hr(),
+        html.Div([
+            dash_table.DataTable(
+                id='table-daily-summaries',
+                fixed_rows={'headers': True},
+                columns=[
+                    {"id": n, "name": n}
+                    for n in data.DailyWorkSummaryTableView.get_columns()],
+                data=[],
+                editable=False,
+                page_size=10,
+                style_cell={'textAlign': 'left'},
+                style_header={
+                    'fontWeight': 'bold'
+                },
+            ),
+        ]),
+    ])
 
 @dash.callback(
     Output("table-tasks", "data"),
-    Output("table-tasks", "selected_cells"),
-    Output("table-tasks", "active_cell"),
     Output("table-daily-summaries", "data"),
     Output("title", "children"),
-    Output("table-tasks", "filter_query"),
-    Input("table-tasks", "active_cell"),
-    State("table-tasks", "derived_viewport_data"),
+    Input("data-version", "data"),
 )
-def cell_clicked(active_cell, data):
-    reset_filter = False
-    if active_cell:
-        task_id = active_cell["row_id"]
-        ctrl.change_task_state(task_id)
-        reset_filter = True
-
+def refresh(version):
     return (
         ctrl.get_tasks_view().get_data(),
-        [],
-        None,
-        ctrl.get_daily_summary_table(MAX_DAILY_SUMMARIES).get_data(),
+        ctrl.get_daily_summary_table(common.MAX_DAILY_SUMMARIES).get_data(),
         ctrl.get_active_task_name(),
-        "" if reset_filter else dash.no_update,
     )
 
 @dash.callback(
-    Output("table-tasks", "data", allow_duplicate=True),
-    Output("table-daily-summaries", "data", allow_duplicate=True),
+    Output("table-tasks", "selected_cells"),
+    Output("table-tasks", "active_cell"),
+    Output("table-tasks", "filter_query"),
+    Output("new-version", "data"),
+    Input("table-tasks", "active_cell"),
+    prevent_initial_call=True,
+)
+def cell_clicked(active_cell):
+    if not active_cell:
+        return [], None, dash.no_update, dash.no_update
+
+    ctrl.change_task_state(active_cell["row_id"])
+    return [], None, "", ctrl.get_version_tag()
+
+@dash.callback(
     Output("task-name-input", "value"),
-    Output("title", "children", allow_duplicate=True),
+    Output("new-version", "data", allow_duplicate=True),
     State("task-name-input", "value"),
     Input("new-task-button", "n_clicks"),
     prevent_initial_call=True,
@@ -109,13 +115,25 @@ def cell_clicked(active_cell, data):
 def add_new_task(name, n_clicks):
     task = ctrl.add_task(name)
     ctrl.change_task_state(task.id)
-    return (
-        ctrl.get_tasks_view().get_data(),
-        ctrl.get_daily_summary_table(MAX_DAILY_SUMMARIES).get_data(),
-        "",
-        ctrl.get_active_task_name(),
-    )
+    return "", ctrl.get_version_tag()
 
+# the only place data-version is changed, so a new version is taken over
+# once, regardless of whether the push or the response of the change made
+# in this tab arrives first
+dash.clientside_callback(
+    """
+    function(version, current) {
+        if (version === null || version === undefined || version === current) {
+            return dash_clientside.no_update;
+        }
+        return version;
+    }
+    """,
+    Output("data-version", "data"),
+    Input("new-version", "data"),
+    State("data-version", "data"),
+    prevent_initial_call=True,
+)
 
 dash.clientside_callback(
     """
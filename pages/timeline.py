@@ -1,46 +1,74 @@
 import dash
 from dash import html, dcc, Input, Output
 import data
-import plotly.express as px
-import pandas as pd
+import calendar
 import datetime
 
+# runs shorter than a pixel of the figure are downsampled
+TIMELINE_WIDTH = 1500  # px
+
 dash.register_page(__name__)
 
 ctrl = data.Controller.get()
 
-def get_timeline(date):
+def get_time_range(date, zoom):
+    if zoom == "week":
+        start = date - datetime.timedelta(days=date.weekday())
+        end = start + datetime.timedelta(days=6)
+    elif zoom == "month":
+        start = date.replace(day=1)
+        end = date.replace(
+            day=calendar.monthrange(date.year, date.month)[1])
+    else:
+        start = end = date
+
+    return start, end
+
+def get_timeline(date, zoom="day"):
+    import plotly.express as px
+
+    start, end = get_time_range(date, zoom)
+
     fig = px.timeline(
-        ctrl.get_daily_timeline_dataframe(date),
+        ctrl.get_timeline_dataframe(start, end, TIMELINE_WIDTH),
         x_start="start",
         x_end="end",
         y="name",
         text="name",
         color="name", # to put the same task to the same line
-        title=f"Timeline of {date}",
+        title=(
+            f"Timeline of {start}" if start == end
+            else f"Timeline between {start} - {end}"),
     )
     return fig
 
-layout = html.Div([
+def layout(**kwargs):
+    # the timeline is filled by the initial call of update_chart
+    return html.Div([
         dcc.DatePickerSingle(
-        id='date-picker',
-        initial_visible_month=datetime.date.today(),
-        date=datetime.date.today(),
-        min_date_allowed=ctrl.get_first_activity_date().date(),
-        first_day_of_week=1,
-    ),
-    dcc.Graph(
-        id='activity-timeline',
-        figure=get_timeline(datetime.date.today()),
-        #style={'height': '90vh'},
-    ),
-])
-
+            id='date-picker',
+            initial_visible_month=datetime.date.today(),
+            date=datetime.date.today(),
+            min_date_allowed=ctrl.get_first_activity_date().date(),
+            first_day_of_week=1,
+        ),
+        dcc.RadioItems(
+            id='zoom-radio',
+            options=["day", "week", "month"],
+            value="day",
+            inline=True,
+        ),
+        dcc.Graph(
+            id='activity-timeline',
+            #style={'height': '90vh'},
+        ),
+    ])
 
 
 @dash.callback(
     Output('activity-timeline', 'figure'),
     Input('date-picker', 'date'),
+    Input('zoom-radio', 'value'),
 )
-def update_chart(date):
-    return get_timeline(datetime.date.fromisoformat(date))
+def update_chart(date, zoom):
+    return get_timeline(datetime.date.fromisoformat(date), zoom)
@@ -0,0 +1,267 @@
+import datetime
+
+import pytest
+
+import data
+
+
+def act(id, task_id, action, at):
+    return data.Activity(id, task_id, action, f"2024-01-01T{at}")
+
+
+def summary(activities):
+    return [(a.id, a.task_id, a.action, a.at[11:]) for a in activities]
+
+
+def test_normalize_keeps_valid_activities():
+    activities = [
+        act(0, 0, data.Action.START, "09:00:00"),
+        act(1, 0, data.Action.STOP, "10:00:00"),
+        act(2, 1, data.Action.START, "10:00:00"),
+    ]
+
+    assert data.normalize_activities(activities) == activities
+
+
+def test_normalize_keeps_order_when_clock_goes_backwards():
+    # e.g. at the end of daylight saving time 02:10 follows 02:30
+    activities = [
+        act(0, 0, data.Action.START, "02:30:00"),
+        act(1, 0, data.Action.STOP, "02:10:00"),
+    ]
+
+    normalized = data.normalize_activities(activities)
+
+    assert summary(normalized) == [
+        (0, 0, data.Action.START, "02:30:00"),
+        (1, 0, data.Action.STOP, "02:10:00"),
+    ]
+    assert normalized[1].time == normalized[0].time
+
+
+def test_loading_across_clock_going_backwards_keeps_all_activities():
+    loaded = data.Activities.from_primitive([
+        {"id": 0, "task_id": 0, "action": 1, "at": "2024-10-27T02:30:00"},
+        {"id": 1, "task_id": 0, "action": 2, "at": "2024-10-27T02:10:00"},
+    ])
+
+    assert len(loaded) == 2
+    assert not loaded.repaired
+    assert loaded.get_active_task_id() is None
+    assert loaded.get_runtime() == datetime.timedelta()
+
+
+def test_normalize_stops_running_task_when_another_starts():
+    activities = [
+        act(0, 0, data.Action.START, "09:00:00"),
+        act(1, 1, data.Action.START, "10:00:00"),
+        act(2, 1, data.Action.STOP, "11:00:00"),
+    ]
+
+    assert summary(data.normalize_activities(activities)) == [
+        (0, 0, data.Action.START, "09:00:00"),
+        (3, 0, data.Action.STOP, "10:00:00"),
+        (1, 1, data.Action.START, "10:00:00"),
+        (2, 1, data.Action.STOP, "11:00:00"),
+    ]
+
+
+def test_normalize_drops_duplicate_start_and_stray_stop():
+    activities = [
+        act(0, 0, data.Action.STOP, "08:00:00"),
+        act(1, 0, data.Action.START, "09:00:00"),
+        act(2, 0, data.Action.START, "09:30:00"),
+        act(3, 1, data.Action.STOP, "09:45:00"),
+        act(4, 0, data.Action.STOP, "10:00:00"),
+        act(5, 0, data.Action.STOP, "11:00:00"),
+    ]
+
+    assert summary(data.normalize_activities(activities)) == [
+        (1, 0, data.Action.START, "09:00:00"),
+        (4, 0, data.Action.STOP, "10:00:00"),
+    ]
+
+
+def test_normalized_activities_build_spans():
+    activities = data.Activities(data.normalize_activities([
+        act(0, 0, data.Action.START, "09:00:00"),
+        act(1, 1, data.Action.START, "10:00:00"),
+        act(2, 1, data.Action.STOP, "10:30:00"),
+    ]))
+
+    assert activities.get_runtime() == datetime.timedelta(hours=1, minutes=30)
+    assert activities.get_active_task_id() is None
+
+
+def test_activities_reject_not_normalized_input():
+    with pytest.raises(ValueError):
+        data.Activities([act(0, 0, data.Action.STOP, "09:00:00")])
+    with pytest.raises(ValueError):
+        data.Activities([
+            act(0, 0, data.Action.START, "09:00:00"),
+            act(1, 0, data.Action.STOP, "08:00:00"),
+        ])
+
+
+def test_create_one_keeps_times_sorted_when_clock_goes_backwards():
+    future = datetime.datetime.now() + datetime.timedelta(hours=1)
+    activities = data.Activities([
+        data.Activity(0, 0, data.Action.START, future.isoformat())])
+
+    activities.create_one(0, data.Action.STOP)
+
+    assert activities.times == [future, future]
+    assert activities.get_runtime() == datetime.timedelta()
+
+
+def at(day, time):
+    return datetime.datetime.fromisoformat(f"2024-01-{day:02}T{time}")
+
+
+def test_filter_by_day_splits_run_across_midnight():
+    activities = data.Activities([
+        data.Activity(0, 0, data.Action.START, "2024-01-01T23:00:00"),
+        data.Activity(1, 0, data.Action.STOP, "2024-01-02T01:00:00"),
+        data.Activity(2, 1, data.Action.START, "2024-01-02T02:00:00"),
+        data.Activity(3, 1, data.Action.STOP, "2024-01-02T03:00:00"),
+    ])
+
+    first = activities.filter_by_day(datetime.date(2024, 1, 1))
+    second = activities.filter_by_day(datetime.date(2024, 1, 2))
+
+    assert first.get_runtime() == datetime.timedelta(hours=1)
+    assert second.get_runtime() == datetime.timedelta(hours=2)
+    assert [(s.task_id, s.start, s.end) for s in second.spans] == [
+        (0, at(2, "00:00:00"), at(2, "01:00:00")),
+        (1, at(2, "02:00:00"), at(2, "03:00:00")),
+    ]
+    # the STOP of the run started the day before is still in the day
+    assert len(second) == 3
+
+
+def test_get_spans_selects_overlapping_spans():
+    activities = data.Activities([
+        data.Activity(0, 0, data.Action.START, "2024-01-01T09:00:00"),
+        data.Activity(1, 0, data.Action.STOP, "2024-01-01T10:00:00"),
+        data.Activity(2, 1, data.Action.START, "2024-01-01T10:00:00"),
+        data.Activity(3, 1, data.Action.STOP, "2024-01-01T11:00:00"),
+        data.Activity(4, 2, data.Action.START, "2024-01-01T12:00:00"),
+        data.Activity(5, 2, data.Action.STOP, "2024-01-01T13:00:00"),
+    ])
+
+    # a span ending at the start of the range is not part of it
+    spans = activities.get_spans(at(1, "10:00:00"), at(1, "12:30:00"))
+
+    assert [(s.task_id, s.start, s.end) for s in spans] == [
+        (1, at(1, "10:00:00"), at(1, "11:00:00")),
+        (2, at(1, "12:00:00"), at(1, "12:30:00")),
+    ]
+
+
+def test_clip_running_span():
+    start = datetime.datetime.now() - datetime.timedelta(hours=1)
+    running = data.Span(0, start, None)
+
+    # still running within a range ending in the future
+    future = running.clip(start, start + datetime.timedelta(days=1))
+    assert future.end is None
+    # ends with a range ending in the past
+    past = running.clip(
+        start - datetime.timedelta(hours=1),
+        start + datetime.timedelta(minutes=30))
+    assert past.start == start
+    assert past.end == start + datetime.timedelta(minutes=30)
+
+
+def test_running_task_counts_until_now():
+    start = datetime.datetime.now() - datetime.timedelta(hours=1)
+    activities = data.Activities([
+        data.Activity(0, 3, data.Action.START, start.isoformat())])
+
+    assert activities.get_active_task_id() == 3
+    today = activities.filter_by_date_range(
+        start.date(), datetime.date.today())
+    assert today.get_active_task_id() == 3
+    assert today.get_runtime() >= datetime.timedelta(hours=1)
+
+
+def span(task_id, start, end):
+    return data.Span(
+        task_id,
+        datetime.datetime.fromisoformat(f"2024-01-01T{start}"),
+        datetime.datetime.fromisoformat(f"2024-01-01T{end}"),
+    )
+
+
+def run_every(task_ids, length, start, end):
+    """Spans of length seconds of the tasks one after the other."""
+    spans = []
+    at = datetime.datetime.fromisoformat(f"2024-01-01T{start}")
+    end = datetime.datetime.fromisoformat(f"2024-01-01T{end}")
+    i = 0
+    while at < end:
+        next_at = at + datetime.timedelta(seconds=length)
+        spans.append(data.Span(task_ids[i % len(task_ids)], at, next_at))
+        at = next_at
+        i += 1
+    return spans
+
+
+DAY_START = datetime.datetime(2024, 1, 1)
+DAY_END = datetime.datetime(2024, 1, 2)
+
+
+def downsample(spans, nr_of_slots=24):
+    # with 24 slots a slot is an hour
+    return [
+        (s.task_id, s.start.time().isoformat(), s.end.time().isoformat())
+        for s in data.downsample_spans(spans, DAY_START, DAY_END, nr_of_slots)
+    ]
+
+
+def test_downsample_keeps_few_spans():
+    spans = [span(0, "00:00:00", "01:00:00"), span(1, "09:00:00", "09:00:20")]
+
+    assert downsample(spans) == [
+        (0, "00:00:00", "01:00:00"),
+        (1, "09:00:00", "09:00:20"),
+    ]
+
+
+def test_downsample_is_bounded_and_does_not_overlap():
+    spans = run_every([0, 1], 10, "00:00:00", "23:59:59")
+
+    downsampled = data.downsample_spans(spans, DAY_START, DAY_END, 24)
+
+    assert len(downsampled) <= 24
+    for prev, next in zip(downsampled, downsampled[1:]):
+        assert prev.end <= next.start
+
+
+def test_downsample_keeps_the_boundaries_of_long_spans():
+    spans = (
+        run_every([0, 1], 10, "08:00:00", "08:30:05")
+        + [span(2, "08:30:05", "10:15:00")]
+        + run_every([1], 10, "10:15:00", "10:20:00")
+    )
+
+    assert downsample(spans) == [
+        (0, "08:00:00", "08:30:05"),
+        (2, "08:30:05", "10:15:00"),
+        (1, "10:15:00", "10:20:00"),
+    ]
+
+
+def test_downsample_leaves_slot_idle_if_short_spans_are_sparse():
+    spans = (
+        [span(0, f"09:{m:02}:00", f"09:{m:02}:10") for m in range(0, 60, 2)]
+        + [span(1, f"10:{m:02}:00", f"10:{m:02}:10") for m in range(0, 60, 2)]
+    )
+
+    assert downsample(spans) == []
+
+
+def test_downsample_trims_to_the_first_and_last_short_span():
+    spans = run_every([0, 0, 1], 10, "09:10:00", "09:50:00")
+
+    assert downsample(spans) == [(0, "09:10:00", "09:50:00")]